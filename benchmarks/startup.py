@@ -0,0 +1,116 @@
+"""Measure import time and startup of the scraper's commands.
+
+Offline commands should finish in milliseconds and never import the browser
+or prompt libraries. Run from the repository root:
+
+    python benchmarks/startup.py [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPER = os.path.join(ROOT, "scraper.py")
+
+# Modules only scraping needs. Offline commands must not load any of them.
+HEAVY_MODULES = ("playwright", "questionary", "rich", "asyncio", "markdownify")
+
+
+def make_output(root):
+    """Create a small output tree with one course, quiz and document."""
+    quiz = os.path.join(root, "Course", "Quiz")
+    os.makedirs(os.path.join(quiz, "screenshots"))
+    os.makedirs(os.path.join(quiz, "source"))
+    os.makedirs(os.path.join(root, "Course", "documents"))
+    for number in range(1, 21):
+        with open(os.path.join(quiz, f"{number}.md"), 'w') as f:
+            f.write(f"# Question {number}\n")
+        with open(os.path.join(quiz, "screenshots", f"{number}.png"), 'wb') as f:
+            f.write(b"\x89PNG")
+        with open(os.path.join(quiz, "source", f"{number}.json"), 'w') as f:
+            json.dump({'html': f"<h1>Question {number}</h1>", 'starter_code': "", 'saved_code': ""}, f)
+    with open(os.path.join(root, "Course", "documents", "slides.pdf"), 'wb') as f:
+        f.write(b"%PDF")
+    with open(os.path.join(root, "Course", "links.json"), 'w') as f:
+        json.dump({"https://example.com/mod/url/view.php?id=1": {'name': "Link", 'url': "https://example.com"}}, f)
+
+
+def time_command(arguments, runs):
+    """Median wall time of running the scraper with ``arguments``, in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, SCRAPER] + arguments, cwd=ROOT,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def import_time():
+    """Cumulative import time of the scraper module in milliseconds, from -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import scraper"],
+                            cwd=ROOT, capture_output=True, text=True)
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == "scraper":
+            return int(parts[1]) / 1000
+    raise RuntimeError(result.stderr)
+
+
+def loaded_heavy_modules(arguments):
+    """Heavy modules that are imported after running a command in-process.
+
+    Raises RuntimeError if the command itself fails.
+    """
+    code = (
+        "import sys, io, contextlib, scraper\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        f"    scraper.main({arguments!r})\n"
+        "import json\n"
+        f"print(json.dumps(sorted({{name.split('.')[0] for name in sys.modules}} & set({HEAVY_MODULES!r}))))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="runs per command")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output:
+        make_output(output)
+        # Startup of a bare interpreter, the floor for every command
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            subprocess.run([sys.executable, "-c", "pass"])
+        interpreter_ms = (time.perf_counter() - start) * 1000 / args.runs
+
+        print(f"{'python -c pass':<36} {interpreter_ms:8.1f} ms")
+        print(f"{'import scraper':<36} {import_time():8.1f} ms")
+        for arguments in (["--help"], ["stats", "--output", output], ["verify-output", "--output", output]):
+            label = "scraper.py " + " ".join(arguments[:1])
+            print(f"{label:<36} {time_command(arguments, args.runs):8.1f} ms")
+
+        failed = False
+        staging = os.path.join(output, ".shards")
+        for arguments in (["stats", "--output", output], ["verify-output", "--output", output],
+                          ["merge", "--output", output, "--staging-dir", staging]):
+            heavy = loaded_heavy_modules(arguments)
+            print(f"heavy modules after {arguments[0]}: {', '.join(heavy) or 'none'}")
+            failed = failed or bool(heavy)
+
+    # Fail CI when an offline command regresses into loading the browser stack
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
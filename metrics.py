@@ -0,0 +1,145 @@
+"""Live metrics of a scraping run in the Prometheus text format.
+
+Metrics are always collected, which is cheap. ``start_metrics_server``
+exposes them on a local HTTP endpoint so runs without a terminal (cron,
+systemd, CI) can still be followed.
+"""
+import threading
+import time
+from collections import deque
+
+NAVIGATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Window for the questions per second gauge
+RATE_WINDOW = 60
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """A minimal thread-safe registry of counters, gauges and histograms."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.definitions = {}
+        self.values = {}
+        self.question_times = deque()
+        self.started = time.time()
+
+    def define(self, name, kind, help_text, buckets=None):
+        self.definitions[name] = (kind, help_text, buckets)
+        self.values.setdefault(name, {})
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[name][key] = value
+
+    def observe(self, name, value, **labels):
+        buckets = self.definitions[name][2]
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            if key not in series:
+                series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            histogram = series[key]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def question_done(self):
+        """Count a processed quiz question and feed the questions per second gauge."""
+        self.inc("scraper_questions_total")
+        now = time.time()
+        with self.lock:
+            self.question_times.append(now)
+
+    def questions_per_second(self):
+        now = time.time()
+        with self.lock:
+            while self.question_times and self.question_times[0] < now - RATE_WINDOW:
+                self.question_times.popleft()
+            window = max(1, min(RATE_WINDOW, now - self.started))
+            return len(self.question_times) / window
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        self.set("scraper_questions_per_second", self.questions_per_second())
+        self.set("scraper_uptime_seconds", time.time() - self.started)
+
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, buckets) in self.definitions.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(self.values[name].items()):
+                    if kind != "histogram":
+                        lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+                        continue
+                    for bound, count in zip(buckets + (float("inf"),), value['buckets'] + [value['count']]):
+                        labels = _format_labels(key + (("le", _format_value(bound)),))
+                        lines.append(f"{name}_bucket{labels} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(value['sum'])}")
+                    lines.append(f"{name}_count{_format_labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.define("scraper_resources_processed_total", "counter", "Resources processed, by type and outcome.")
+metrics.define("scraper_questions_total", "counter", "Quiz questions saved.")
+metrics.define("scraper_questions_per_second", "gauge", f"Quiz questions saved per second over the last {RATE_WINDOW}s.")
+metrics.define("scraper_bytes_downloaded_total", "counter", "Bytes of downloaded documents, by resource type.")
+metrics.define("scraper_navigation_seconds", "histogram", "Time spent in page navigations.", NAVIGATION_BUCKETS)
+metrics.define("scraper_failures_total", "counter", "Failed operations, by kind.")
+metrics.define("scraper_retries_total", "counter", "Retried operations, by kind.")
+metrics.define("scraper_queue_depth", "gauge", "Items still waiting to be processed, by queue.")
+metrics.define("scraper_uptime_seconds", "gauge", "Seconds since the scraper started.")
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve the metrics on ``http://host:port/metrics`` from a background thread."""
+    # Imported here so that runs without the endpoint don't pay for http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Keep scrapes of the endpoint out of the console
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
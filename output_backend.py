@@ -0,0 +1,261 @@
+"""Output backends for the scraped files.
+
+``DirectoryBackend`` writes the usual ``output/<course>/...`` tree of small
+files. ``SQLiteBackend`` stores the same paths inside one SQLite file, which
+is much friendlier to network filesystems and inode quotas, and can be turned
+back into the directory layout with ``export_bundle``.
+"""
+import hashlib
+import os
+import pathlib
+import shutil
+import sqlite3
+import time
+import zlib
+
+BUNDLE_EXTENSIONS = (".sqlite", ".sqlite3", ".db")
+
+# Only keep the compressed version if it saves at least this much
+MIN_COMPRESSION_RATIO = 0.9
+
+# Formats that are compressed already, a zlib pass over them is wasted time
+COMPRESSED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".pdf", ".zip", ".gz", ".bz2", ".xz",
+                         ".7z", ".rar", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".mp3", ".mp4")
+COMPRESSED_MAGIC = (b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"%PDF", b"PK\x03\x04", b"\x1f\x8b", b"7z\xbc\xaf")
+
+# Files at least this big are streamed into a bundle as they are instead of read into memory
+STREAM_THRESHOLD = 16 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_compressed_format(rel_path, head=b""):
+    """Whether a file is compressed already, judging by its extension or first bytes."""
+    return rel_path.lower().endswith(COMPRESSED_EXTENSIONS) or head.startswith(COMPRESSED_MAGIC)
+
+
+class DirectoryBackend:
+    """Write every file to its own path below ``root``."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, rel_path):
+        return os.path.join(self.root, *rel_path.split("/"))
+
+    def write_bytes(self, rel_path, data):
+        path = self._path(rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def write_text(self, rel_path, text):
+        self.write_bytes(rel_path, text.encode('utf-8'))
+
+    def write_file(self, rel_path, source_path):
+        path = self._path(rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(source_path, path)
+
+    def read_bytes(self, rel_path):
+        """Return the content of a file, or None if it does not exist."""
+        try:
+            with open(self._path(rel_path), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def file_size(self, rel_path):
+        return os.path.getsize(self._path(rel_path))
+
+    def verify(self):
+        """Return integrity problems. Plain files carry no checksums to compare against."""
+        return []
+
+    def list_files(self, prefix=""):
+        """Yield the relative paths of all files, optionally below ``prefix``."""
+        for dirpath, dirnames, filenames in os.walk(self._path(prefix) if prefix else self.root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                yield os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SQLiteBackend:
+    """Store every file as a row of a single SQLite database.
+
+    Writes are batched: a transaction is committed every ``batch_size`` files
+    and on ``flush``/``close``. Data is zlib-compressed when that pays off,
+    which helps a lot for markdown. PNGs, PDFs, ZIPs and files too big to hold
+    in memory are streamed into the database in chunks and stored as they are.
+
+    The default rollback journal is kept on purpose, WAL does not work on
+    network filesystems. With ``read_only`` the file is never modified.
+    """
+
+    def __init__(self, path, batch_size=200, read_only=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = 0
+
+        if read_only:
+            self.connection = sqlite3.connect(pathlib.Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                compressed INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                modified REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    def _written(self):
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def write_bytes(self, rel_path, data):
+        stored, compressed = data, 0
+        if not is_compressed_format(rel_path, data[:8]):
+            packed = zlib.compress(data, 6)
+            if len(packed) < len(data) * MIN_COMPRESSION_RATIO:
+                stored, compressed = packed, 1
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files (path, data, compressed, size, sha256, modified) VALUES (?, ?, ?, ?, ?, ?)",
+            (rel_path, stored, compressed, len(data), hashlib.sha256(data).hexdigest(), time.time())
+        )
+        self._written()
+
+    def write_text(self, rel_path, text):
+        self.write_bytes(rel_path, text.encode('utf-8'))
+
+    def write_file(self, rel_path, source_path):
+        size = os.path.getsize(source_path)
+        with open(source_path, 'rb') as f:
+            head = f.read(8)
+            if size < STREAM_THRESHOLD and not is_compressed_format(rel_path, head):
+                self.write_bytes(rel_path, head + f.read())
+                return
+
+            # Reserve the blob, then fill it chunk by chunk so memory use does not grow with the file
+            cursor = self.connection.execute(
+                "INSERT OR REPLACE INTO files (path, data, compressed, size, sha256, modified) "
+                "VALUES (?, zeroblob(?), 0, ?, '', ?)",
+                (rel_path, size, size, time.time())
+            )
+            sha = hashlib.sha256()
+            f.seek(0)
+            with self.connection.blobopen("files", "data", cursor.lastrowid) as blob:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    sha.update(chunk)
+                    blob.write(chunk)
+        self.connection.execute("UPDATE files SET sha256 = ? WHERE rowid = ?", (sha.hexdigest(), cursor.lastrowid))
+        self._written()
+
+    def read_bytes(self, rel_path):
+        """Return the content of a file, or None if it does not exist."""
+        row = self.connection.execute(
+            "SELECT data, compressed FROM files WHERE path = ?", (rel_path,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, compressed = row
+        return zlib.decompress(data) if compressed else data
+
+    def file_size(self, rel_path):
+        row = self.connection.execute("SELECT size FROM files WHERE path = ?", (rel_path,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(rel_path)
+        return row[0]
+
+    def verify(self):
+        """Return integrity problems of the database and of every stored file."""
+        problems = [f"{self.path}: {result}" for (result,) in
+                    self.connection.execute("PRAGMA quick_check").fetchall() if result != "ok"]
+        if problems:
+            return problems
+
+        for path, size, sha256 in self.connection.execute("SELECT path, size, sha256 FROM files").fetchall():
+            try:
+                data = self.read_bytes(path)
+            except zlib.error as e:
+                problems.append(f"{path}: cannot decompress ({e})")
+                continue
+            if len(data) != size or hashlib.sha256(data).hexdigest() != sha256:
+                problems.append(f"{path}: checksum mismatch")
+        return problems
+
+    def list_files(self, prefix=""):
+        """Yield the relative paths of all files, optionally below ``prefix``."""
+        if prefix:
+            pattern = prefix.rstrip("/").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%"
+            rows = self.connection.execute(
+                "SELECT path FROM files WHERE path LIKE ? ESCAPE '\\' ORDER BY path", (pattern,)
+            )
+        else:
+            rows = self.connection.execute("SELECT path FROM files ORDER BY path")
+        for (path,) in rows.fetchall():
+            yield path
+
+    def flush(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def is_bundle_path(path):
+    """Whether a path points to a SQLite bundle rather than a folder."""
+    return path.lower().endswith(BUNDLE_EXTENSIONS)
+
+
+def open_backend(path, read_only=False):
+    """Open the backend matching ``path``: a bundle file or an output folder."""
+    if is_bundle_path(path):
+        return SQLiteBackend(path, read_only=read_only)
+    return DirectoryBackend(path)
+
+
+def export_bundle(bundle_path, target_dir):
+    """Restore the directory layout of a bundle into ``target_dir``.
+
+    Returns the number of exported files.
+    """
+    if not os.path.exists(bundle_path):
+        raise FileNotFoundError(f"Bundle not found: {bundle_path}")
+
+    count = 0
+    target = DirectoryBackend(target_dir)
+    with SQLiteBackend(bundle_path, read_only=True) as bundle:
+        for rel_path in bundle.list_files():
+            target.write_bytes(rel_path, bundle.read_bytes(rel_path))
+            count += 1
+    return count
@@ -0,0 +1,165 @@
+"""Offline commands on scraped output: rebuild markdown, verify and stats.
+
+Nothing in here needs a browser. Everything works on both output backends,
+a plain ``output/`` folder or a SQLite bundle.
+"""
+import json
+import posixpath
+
+LINKS_INDEX = "links.json"
+SOURCE_FOLDER = "source"
+SCREENSHOTS_FOLDER = "screenshots"
+DOCUMENTS_FOLDER = "documents"
+
+
+def render_question_markdown(source):
+    """Convert the saved source of a quiz question to markdown."""
+    # markdownify is only needed here, so offline commands that don't render stay fast
+    from markdownify import markdownify as md
+
+    content_markdown = md(source['html'],
+                          heading_style="ATX",
+                          bullets="-",
+                          code_language="",
+                          strip=['script', 'style'])
+
+    # If starter code is available, add it as a code block
+    starter_code = source.get('starter_code', "").strip()
+    if starter_code:
+        content_markdown += f"\n\n## Starter Code:\n\n```cpp\n{starter_code}\n```\n"
+
+    # Add saved code as a code block if it exists
+    saved_code = source.get('saved_code', "").strip()
+    if saved_code:
+        content_markdown += f"\n\n## Saved Code:\n\n```cpp\n{saved_code}\n```\n"
+
+    return content_markdown
+
+
+def classify(rel_path):
+    """Work out what a file in the output layout is.
+
+    Returns ``(kind, course, quiz)`` where ``quiz`` is None for course level files.
+    """
+    parts = rel_path.split("/")
+    course = parts[0]
+    if len(parts) == 2:
+        if parts[1] == "course.png":
+            return "overview", course, None
+        if parts[1] == LINKS_INDEX:
+            return "links", course, None
+    if len(parts) == 3:
+        if parts[1] == DOCUMENTS_FOLDER:
+            return "document", course, None
+        if parts[1] == "links" and parts[2].endswith(".txt"):
+            return "legacy_link", course, None
+        if parts[2].endswith(".md"):
+            return "question", course, parts[1]
+    if len(parts) == 4:
+        if parts[2] == SCREENSHOTS_FOLDER and parts[3].endswith(".png"):
+            return "screenshot", course, parts[1]
+        if parts[2] == SOURCE_FOLDER and parts[3].endswith(".json"):
+            return "source", course, parts[1]
+    return "other", course, None
+
+
+def iter_output_files(output):
+    """Yield ``(rel_path, kind, course, quiz)`` for every file, skipping hidden folders."""
+    for rel_path in output.list_files():
+        if rel_path.startswith("."):
+            continue
+        yield (rel_path,) + classify(rel_path)
+
+
+def question_number(rel_path):
+    return posixpath.splitext(posixpath.basename(rel_path))[0]
+
+
+def rebuild_markdown(output):
+    """Regenerate every question's markdown from its saved source.
+
+    Returns the number of rewritten files.
+    """
+    count = 0
+    for rel_path, kind, course, quiz in iter_output_files(output):
+        if kind != "source":
+            continue
+        source = json.loads(output.read_bytes(rel_path))
+        output.write_text(f"{course}/{quiz}/{question_number(rel_path)}.md", render_question_markdown(source))
+        count += 1
+    output.flush()
+    return count
+
+
+def verify_output(output):
+    """Check the output for damaged or incomplete files.
+
+    Returns a list of human readable problems, empty if everything is fine.
+    """
+    problems = list(output.verify())
+    questions = {}
+
+    for rel_path, kind, course, quiz in iter_output_files(output):
+        if output.file_size(rel_path) == 0:
+            problems.append(f"{rel_path}: empty file")
+
+        if kind == "links":
+            try:
+                index = json.loads(output.read_bytes(rel_path))
+                if not isinstance(index, dict) or not all(
+                        isinstance(link, dict) and link.get('url') for link in index.values()):
+                    problems.append(f"{rel_path}: unexpected links index format")
+            except ValueError as e:
+                problems.append(f"{rel_path}: invalid JSON ({e})")
+        elif kind == "source":
+            try:
+                json.loads(output.read_bytes(rel_path))['html']
+            except (ValueError, KeyError, TypeError):
+                problems.append(f"{rel_path}: invalid question source")
+
+        if kind in ("question", "screenshot", "source"):
+            questions.setdefault((course, quiz, question_number(rel_path)), set()).add(kind)
+
+    for (course, quiz, number), kinds in sorted(questions.items()):
+        prefix = f"{course}/{quiz}/{number}"
+        if "question" not in kinds:
+            problems.append(f"{prefix}: markdown missing")
+        if "screenshot" not in kinds:
+            problems.append(f"{prefix}: screenshot missing")
+
+    return problems
+
+
+def output_stats(output):
+    """Count files and bytes per course and kind."""
+    courses = {}
+    for rel_path, kind, course, quiz in iter_output_files(output):
+        stats = courses.setdefault(course, {'files': 0, 'bytes': 0, 'quizzes': set(), 'kinds': {}})
+        size = output.file_size(rel_path)
+        stats['files'] += 1
+        stats['bytes'] += size
+        if quiz:
+            stats['quizzes'].add(quiz)
+        kind_stats = stats['kinds'].setdefault(kind, {'files': 0, 'bytes': 0})
+        kind_stats['files'] += 1
+        kind_stats['bytes'] += size
+
+        if kind == "links":
+            # A broken index is reported by verify-output, stats just counts no links
+            try:
+                index = json.loads(output.read_bytes(rel_path))
+            except ValueError:
+                index = {}
+            stats['links'] = len(index) if isinstance(index, dict) else 0
+
+    for stats in courses.values():
+        stats['quizzes'] = len(stats['quizzes'])
+        stats.setdefault('links', 0)
+    return courses
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
@@ -0,0 +1,191 @@
+"""Disk-backed HTTP response cache hooked into Playwright routing.
+
+Static assets (stylesheets, scripts, images, fonts) are always served from
+the cache once fetched. Pages are only cached with ``cache_pages``. In
+``replay`` mode nothing goes to the network: every request is answered from
+previously recorded traffic, so parsing and markdown generation can be re-run
+offline. Successful (2xx) responses are recorded, and so are redirects of
+pages, so replay can follow the same chains (e.g. starting a quiz attempt).
+Redirects to the login page are never recorded, they only mean the session
+had expired.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse
+
+CACHE_FILE = os.path.join(".cache", "responses.sqlite")
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+STATIC_RESOURCE_TYPES = {"stylesheet", "script", "image", "font", "media"}
+PAGE_RESOURCE_TYPES = {"document", "xhr", "fetch"}
+
+# Form fields that change between sessions without changing the response
+IGNORED_BODY_FIELDS = {"sesskey"}
+
+# Path fragments of the Moodle and CAS login pages
+LOGIN_PATH_MARKERS = ("/login", "/cas/")
+
+# The body handed to fulfill() is already decoded and complete
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+
+
+def cache_key(method, url, body=None, content_type=""):
+    """Build the cache key of a request from its method, URL and relevant body."""
+    sha = hashlib.sha256(f"{method.upper()} {url}".encode("utf-8"))
+    if body:
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            fields = [(k, v) for k, v in parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True)
+                      if k not in IGNORED_BODY_FIELDS]
+            body = urlencode(sorted(fields)).encode("utf-8")
+        sha.update(b"\n")
+        sha.update(body)
+    return sha.hexdigest()
+
+
+class ResponseCache:
+    """Store responses in a SQLite file with TTL and size-limited LRU eviction."""
+
+    def __init__(self, path=CACHE_FILE, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES,
+                 cache_pages=False, replay=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.cache_pages = cache_pages
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key, max_age=None):
+        """Return ``(status, headers, body)`` for a key, or None if missing or expired."""
+        row = self.connection.execute(
+            "SELECT status, headers, body, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, headers, body, created = row
+        if max_age is not None and time.time() - created > max_age:
+            return None
+        self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return status, json.loads(headers), body
+
+    def put(self, key, method, url, status, headers, body):
+        """Store a response and evict the least recently used ones if over the size limit."""
+        # Never let a single response take over most of the cache
+        if len(body) > self.max_bytes // 4:
+            return
+        headers = {name: value for name, value in headers.items() if name.lower() not in DROPPED_HEADERS}
+        now = time.time()
+
+        previous = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses (key, method, url, status, headers, body, size, created, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, method, url, status, json.dumps(headers), body, len(body), now, now)
+        )
+        self.total_bytes += len(body) - (previous[0] if previous else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self, target_ratio=0.9):
+        """Drop least recently used responses until the cache is below ``target_ratio`` of its limit."""
+        target = self.max_bytes * target_ratio
+        rows = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def should_store(self, request, response):
+        """Whether a fetched response may be recorded."""
+        if 200 <= response.status < 300:
+            return True
+        if not 300 <= response.status < 400 or request.resource_type not in PAGE_RESOURCE_TYPES:
+            return False
+        # With an expired session every page redirects to the login page
+        location = response.headers.get("location")
+        if not location:
+            return False
+        path = urlparse(urljoin(request.url, location)).path.lower()
+        return not any(marker in path for marker in LOGIN_PATH_MARKERS)
+
+    def should_cache(self, request):
+        """Whether a request goes through the cache at all."""
+        if self.replay:
+            return True
+        if request.method != "GET" and not self.cache_pages:
+            return False
+        if request.resource_type in STATIC_RESOURCE_TYPES:
+            return True
+        return self.cache_pages and request.resource_type in PAGE_RESOURCE_TYPES
+
+    def handle_route(self, route, request):
+        """Playwright route handler serving requests from the cache when possible."""
+        if not request.url.startswith(("http://", "https://")) or not self.should_cache(request):
+            route.continue_()
+            return
+
+        key = cache_key(request.method, request.url, request.post_data_buffer,
+                        request.headers.get("content-type", ""))
+
+        # Static assets never expire, pages only live for the TTL, replay ignores age entirely
+        max_age = None if self.replay or request.resource_type in STATIC_RESOURCE_TYPES else self.ttl
+        cached = self.get(key, max_age)
+        if cached:
+            self.hits += 1
+            status, headers, body = cached
+            route.fulfill(status=status, headers=headers, body=body)
+            return
+
+        self.misses += 1
+        if self.replay:
+            route.fulfill(status=504, content_type="text/plain",
+                          body=f"Not recorded: {request.method} {request.url}")
+            return
+
+        # Let the browser follow redirects itself so page.url stays meaningful
+        try:
+            response = route.fetch(max_redirects=0)
+        except Exception:
+            # Fail the request like the browser would, instead of leaving it hanging
+            route.abort()
+            return
+
+        if self.should_store(request, response):
+            self.put(key, request.method, request.url, response.status, response.headers, response.body())
+        route.fulfill(response=response)
+
+    def attach(self, context):
+        """Route every request of a browser context through the cache."""
+        context.route("**/*", self.handle_route)
+
+    def close(self):
+        self.connection.close()
@@ -1,25 +1,59 @@
-from playwright.sync_api import sync_playwright
-from time import sleep
-import questionary
+from time import sleep, perf_counter
 import json
 import os
-import asyncio
+import sys
 import re
-from markdownify import markdownify as md
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
+import argparse
+import subprocess
+from sharding import STAGING_DIR, parse_shard, select_shard, clear_staging, clear_shard, write_manifest, merge_shards
+from output_backend import DirectoryBackend, open_backend, is_bundle_path, export_bundle
+from response_cache import CACHE_FILE, DEFAULT_TTL, ResponseCache
+from watch_state import (MIN_INTERVAL, resource_fingerprint, course_fingerprint, changed_resources,
+                         load_watch_state, save_watch_state, next_delay)
+from metrics import metrics, start_metrics_server
+from output_tools import (LINKS_INDEX, SOURCE_FOLDER, render_question_markdown, rebuild_markdown, verify_output,
+                          output_stats, format_size)
 
-console = Console()
+# playwright, questionary, markdownify and rich are imported where they are used,
+# so that commands which don't need a browser or prompts start instantly
+
+class LazyConsole:
+    """Create the rich console on first use."""
+
+    def __init__(self):
+        self._console = None
+
+    def get(self):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console()
+        return self._console
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+console = LazyConsole()
 
 # Configuration
 BASE_URL = "https://courses.finki.ukim.mk"
 DASHBOARD_URL = "https://courses.finki.ukim.mk/my/"
 COOKIES_FILE = "cookies.json"
+OUTPUT_DIR = "output"
+# Turned off with --no-progress or when there is no terminal to draw on
+show_progress = True
 MINIMAL_WORKING_CODE = """int main() {
   return 0;
 }
 """
 
+def navigate(page, url, **kwargs):
+    """Navigate like page.goto and record how long it took."""
+    start = perf_counter()
+    try:
+        return page.goto(url, **kwargs)
+    finally:
+        metrics.observe("scraper_navigation_seconds", perf_counter() - start)
+
 def load_cookies(page):
     """Load saved cookies if they exist."""
     if os.path.exists(COOKIES_FILE):
@@ -64,6 +98,9 @@ def login(page):
 
         # Handle questionary prompts with event loop management
         def get_credentials():
+            import asyncio
+            import questionary
+
             # Try to get the current event loop
             try:
                 current_loop = asyncio.get_running_loop()
@@ -187,6 +224,8 @@ def get_all_resources(page):
 
 def select_all_resources(resource_groups):
     """Prompt user to select all types of resources (PDFs, URLs, Quizzes) grouped by sections."""
+    import asyncio
+    import questionary
     
     # Create a single list of choices with separators for sections
     all_choices = []
@@ -246,13 +285,9 @@ def select_all_resources(resource_groups):
         console.print("[yellow]No resources found[/yellow]")
         return []
 
-def download_pdf_resource(page, resource, course_folder, task_id=None, progress=None):
+def download_pdf_resource(page, resource, output, course_folder, task_id=None, progress=None):
     """Download a PDF resource."""
     try:
-        # Create downloads folder
-        pdf_folder = os.path.join(course_folder, "documents")
-        os.makedirs(pdf_folder, exist_ok=True)
-        
         # Set up download handling
         def handle_download(download):
             # Get the suggested filename or create one
@@ -260,15 +295,16 @@ def download_pdf_resource(page, resource, course_folder, task_id=None, progress=
             if not suggested_name or not suggested_name.endswith('.pdf'):
                 suggested_name = f"{clean_filename(resource['display_name'])}.pdf"
             
-            download_path = os.path.join(pdf_folder, suggested_name)
-            download.save_as(download_path)
+            download_path = download.path()
+            output.write_file(f"{course_folder}/documents/{suggested_name}", download_path)
+            metrics.inc("scraper_bytes_downloaded_total", os.path.getsize(download_path), type="pdf")
         
         # Listen for downloads
         page.on("download", handle_download)
         
         # Navigate to the PDF URL - this should trigger the download
         try:
-            page.goto(resource['url'], wait_until="domcontentloaded")
+            navigate(page, resource['url'], wait_until="domcontentloaded")
         except Exception:
             # Download might have started immediately, that's expected
             pass
@@ -284,13 +320,9 @@ def download_pdf_resource(page, resource, course_folder, task_id=None, progress=
         console.print(f"[red]Error downloading PDF {resource['display_name']}: {e}[/red]")
         return False
 
-def download_folder_resource(page, resource, course_folder, task_id=None, progress=None):
+def download_folder_resource(page, resource, output, course_folder, task_id=None, progress=None):
     """Download a folder resource as a zip file."""
     try:
-        # Create downloads folder
-        documents_folder = os.path.join(course_folder, "documents")
-        os.makedirs(documents_folder, exist_ok=True)
-        
         # Set up download handling
         def handle_download(download):
             # Get the suggested filename or create one
@@ -298,14 +330,15 @@ def download_folder_resource(page, resource, course_folder, task_id=None, progre
             if not suggested_name or not suggested_name.endswith('.zip'):
                 suggested_name = f"{clean_filename(resource['display_name'])}.zip"
             
-            download_path = os.path.join(documents_folder, suggested_name)
-            download.save_as(download_path)
+            download_path = download.path()
+            output.write_file(f"{course_folder}/documents/{suggested_name}", download_path)
+            metrics.inc("scraper_bytes_downloaded_total", os.path.getsize(download_path), type="folder")
         
         # Listen for downloads
         page.on("download", handle_download)
         
         # Navigate to the folder URL
-        page.goto(resource['url'], wait_until="domcontentloaded")
+        navigate(page, resource['url'], wait_until="domcontentloaded")
         sleep(1)
         
         # Find and click the download button
@@ -327,27 +360,18 @@ def download_folder_resource(page, resource, course_folder, task_id=None, progre
         console.print(f"[red]Error downloading folder {resource['display_name']}: {e}[/red]")
         return False
 
-def open_url_resource(page, resource, course_folder, task_id=None, progress=None):
-    """Open and capture a URL resource."""
+def open_url_resource(page, resource):
+    """Open a URL resource in the browser and return its target URL, or None."""
     try:
         # Navigate to the URL using the existing page
-        page.goto(resource['url'])
+        navigate(page, resource['url'])
         sleep(1)
         
         current_url = page.url
         
         # Check if we got redirected outside the base domain (scenario 2)
         if not current_url.startswith(BASE_URL):
-            # External redirect - save the redirected URL
-            url_folder = os.path.join(course_folder, "links")
-            os.makedirs(url_folder, exist_ok=True)
-            
-            url_info_path = os.path.join(url_folder, f"{clean_filename(resource['display_name'])}.txt")
-            with open(url_info_path, 'w', encoding='utf-8') as f:
-                f.write(f"Name: {resource['display_name']}\n")
-                f.write(f"URL: {current_url}\n")
-            
-            return True
+            return current_url
         
         # We're still on the base domain - check for scenario 1 (urlworkaround div)
         urlworkaround_div = page.query_selector(".urlworkaround")
@@ -355,24 +379,65 @@ def open_url_resource(page, resource, course_folder, task_id=None, progress=None
             # Extract the actual link from the urlworkaround div
             link_element = urlworkaround_div.query_selector("a")
             if link_element:
-                actual_url = link_element.get_attribute("href")
-                
-                # Save the extracted URL info
-                url_folder = os.path.join(course_folder, "links")
-                os.makedirs(url_folder, exist_ok=True)
-                
-                url_info_path = os.path.join(url_folder, f"{resource['display_name']}.txt")
-                with open(url_info_path, 'w', encoding='utf-8') as f:
-                    f.write(f"Name: {resource['display_name']}\n")
-                    f.write(f"URL: {actual_url}\n")
-                
-                return True
+                return link_element.get_attribute("href")
         
         raise Exception("No way to extract URL from the page")
         
     except Exception as e:
         console.print(f"[red]Error capturing URL {resource['display_name']}: {e}[/red]")
-        return False
+        return None
+
+def update_links_index(output, course_folder, links):
+    """Merge resolved links into the course's links.json, keyed by resource URL."""
+    index_path = f"{course_folder}/{LINKS_INDEX}"
+    existing = output.read_bytes(index_path)
+    index = {}
+    if existing:
+        try:
+            index = json.loads(existing)
+        except ValueError as e:
+            console.print(f"[yellow]Ignoring unreadable {index_path}, starting a new index: {e}[/yellow]")
+        if not isinstance(index, dict):
+            console.print(f"[yellow]Ignoring unexpected content of {index_path}, starting a new index[/yellow]")
+            index = {}
+    index.update(links)
+    output.write_text(index_path, json.dumps(index, indent=2, ensure_ascii=False, sort_keys=True))
+
+def resolve_url_resources(page, resources, output, course_folder, task_id=None, progress=None, bulk=True):
+    """Resolve URL resources and record them in the course's links index.
+
+    Resources are first resolved concurrently over plain HTTP with the browser's
+    cookies. Only the ones that could not be resolved that way are opened in the browser.
+    """
+    resolved = {}
+    if bulk:
+        from url_resolver import resolve_urls
+        resolved = resolve_urls(
+            [resource['url'] for resource in resources],
+            page.context.cookies(),
+            BASE_URL,
+            user_agent=page.evaluate("navigator.userAgent")
+        )
+
+    links = {}
+    for resource in resources:
+        target = resolved.get(resource['url'])
+        if target is None:
+            if bulk:
+                metrics.inc("scraper_retries_total", kind="url_browser_fallback")
+            target = open_url_resource(page, resource)
+        if target:
+            links[resource['url']] = {'name': resource['display_name'], 'url': target}
+            metrics.inc("scraper_resources_processed_total", type="url", status="ok")
+        else:
+            metrics.inc("scraper_resources_processed_total", type="url", status="failed")
+            metrics.inc("scraper_failures_total", kind="url")
+        if progress and task_id is not None:
+            progress.advance(task_id, 1)
+
+    if links:
+        update_links_index(output, course_folder, links)
+    return links
 
 def clean_filename(name):
     """Clean a string to be used as a filename."""
@@ -395,7 +460,9 @@ def remove_header_and_footer(page):
         console.print(f"[red]Could not hide user name: {e}[/red]")
 def remove_unwanted_elements(page):
     """Remove unwanted UI elements from the page content."""
-    for _ in range(10):  # Try up to 10 times in case of race conditions
+    for attempt in range(10):  # Try up to 10 times in case of race conditions
+        if attempt:
+            metrics.inc("scraper_retries_total", kind="remove_elements")
         page.evaluate("""
             const contentDiv = document.querySelector('div.content');
             if (contentDiv) {
@@ -410,7 +477,7 @@ def remove_unwanted_elements(page):
         if (page.query_selector("div.content .ui_wrapper") is None and 
             page.query_selector("div.content .im-controls") is None and 
             page.query_selector("div.content .prompt") is None) and \
-            page.query_selector("div.content textarea.coderunner-answer") and \
+            page.query_selector("div.content textarea.coderunner-answer") is None and \
             page.query_selector("div.content #goto-top-link") is None:
             break
 
@@ -435,8 +502,8 @@ def ensure_question_fully_loaded(page):
             console.print("[yellow]No 'Check' button found, only partial output will be available.[/yellow]")
 
 
-def extract_question_content(page):
-    """Extract and convert question content to markdown."""
+def extract_question_source(page):
+    """Extract the raw question content, the input for render_question_markdown."""
     content_div = page.query_selector("div.content")
     if not content_div:
         return None
@@ -454,6 +521,10 @@ def extract_question_content(page):
     textarea = page.query_selector("textarea.coderunner-answer")
     if textarea:
         textarea_content = textarea.input_value()
+
+    # The code we submitted ourselves to load all test cases is not worth keeping
+    if textarea_content.strip() == MINIMAL_WORKING_CODE.strip():
+        textarea_content = ""
     
     # Remove unwanted  elements
     remove_unwanted_elements(page)
@@ -461,31 +532,17 @@ def extract_question_content(page):
     sleep(0.5)
 
     # Get the cleaned HTML content
-    content_html = content_div.inner_html()
-    
-    # Convert to markdown
-    content_markdown = md(content_html, 
-                        heading_style="ATX",
-                        bullets="-",
-                        code_language="",
-                        strip=['script', 'style'])
-
-    # If starter code is available, add it as a code block
-    if starter_code.strip():
-        content_markdown += f"\n\n## Starter Code:\n\n```cpp\n{starter_code.strip()}\n```\n"        
-    
-    # Add textarea content as a code block if it exists
-    if textarea_content.strip() and textarea_content.strip() != MINIMAL_WORKING_CODE.strip():
-        content_markdown += f"\n\n## Saved Code:\n\n```cpp\n{textarea_content.strip()}\n```\n"
-    
-    return content_markdown
+    return {
+        'html': content_div.inner_html(),
+        'starter_code': starter_code,
+        'saved_code': textarea_content
+    }
 
-def process_quiz_questions(page, quiz, course, task_id=None, progress=None):
+def process_quiz_questions(page, quiz, course, output, task_id=None, progress=None):
     """Process all questions in a quiz."""
     course_name_clean = clean_filename(course)
     quiz_name_clean = clean_filename(quiz['name'])
-    output_folder = f"output/{course_name_clean}/{quiz_name_clean}"
-    os.makedirs(output_folder, exist_ok=True)
+    output_folder = f"{course_name_clean}/{quiz_name_clean}"
     
     # Find all question navigation buttons
     question_buttons = page.query_selector_all("a.qnbutton")
@@ -516,10 +573,11 @@ def process_quiz_questions(page, quiz, course, task_id=None, progress=None):
     
     # Process each question
     for i, question in enumerate(questions, 1):
+        metrics.set("scraper_queue_depth", len(questions) - i + 1, queue="questions")
         if progress and task_id:
             progress.update(task_id, description=f"Quiz question {i}/{len(questions)}")
         
-        page.goto(question['link'])
+        navigate(page, question['link'])
 
         # Make sure all the page content is shown
         ensure_question_fully_loaded(page)
@@ -527,32 +585,32 @@ def process_quiz_questions(page, quiz, course, task_id=None, progress=None):
         # Remove PII
         remove_header_and_footer(page)
 
-        # Extract content and save as markdown
-        content_markdown = extract_question_content(page)
-        if content_markdown:
-            markdown_path = f"{output_folder}/{question['number']}.md"
-            with open(markdown_path, 'w', encoding='utf-8') as f:
-                f.write(content_markdown)
+        # Extract content and save as markdown, keeping the source to rebuild it offline
+        source = extract_question_source(page)
+        if source:
+            output.write_text(f"{output_folder}/{SOURCE_FOLDER}/{question['number']}.json",
+                              json.dumps(source, ensure_ascii=False))
+            output.write_text(f"{output_folder}/{question['number']}.md", render_question_markdown(source))
         else:
             console.print(f"[yellow]No content found for question {question['number']}[/yellow]")
+            metrics.inc("scraper_failures_total", kind="question_content")
 
         # Take full page screenshot
-        screenshots_subfolder = os.path.join(output_folder, "screenshots")
-        os.makedirs(screenshots_subfolder, exist_ok=True)
-        screenshot_path = f"{screenshots_subfolder}/{question['number']}.png"
         content_div = page.query_selector("div.content")
         if content_div:
             content_div.evaluate("el => el.style.width = '1366px'")
-            content_div.screenshot(path=screenshot_path)
+            output.write_bytes(f"{output_folder}/screenshots/{question['number']}.png", content_div.screenshot())
         
+        metrics.question_done()
         if progress and task_id:
             progress.advance(task_id, 1)
     
+    metrics.set("scraper_queue_depth", 0, queue="questions")
     return True
 
 def process_quiz(page, quiz):
     """Process a single quiz."""
-    page.goto(quiz['url'])
+    navigate(page, quiz['url'])
     sleep(2)
 
     # Look for continue button
@@ -569,68 +627,104 @@ def process_quiz(page, quiz):
         console.print(f"[yellow]No continue button found for quiz: {quiz['name']}[/yellow]")
         return False
 
-def process_course(page, course_name, course_url):
-    """Process a single course."""
+def process_resources(page, course_name, resources, output, bulk_links=True):
+    """Download the given resources of a course.
+
+    Returns the resources that were processed successfully.
+    """
+    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
+
+    course_folder = clean_filename(course_name)
+    processed = []
+
+    # Process resources with progress bar
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        console=console.get(),
+        disable=not show_progress
+    ) as progress:
+        
+        task = progress.add_task("Processing resources...", total=len(resources))
+        metrics.set("scraper_queue_depth", len(resources), queue="resources")
+
+        # Resolve all links in one go, they only need a request each
+        url_resources = [resource for resource in resources if resource['type'] == 'url']
+        if url_resources:
+            progress.update(task, description=f"Resolving {len(url_resources)} links...")
+            links = resolve_url_resources(page, url_resources, output, course_folder, task, progress, bulk_links)
+            processed.extend(resource for resource in url_resources if resource['url'] in links)
+            metrics.set("scraper_queue_depth", len(resources) - len(url_resources), queue="resources")
+        
+        # Process each selected resource by type
+        for i, resource in enumerate(resources, 1):
+            if resource['type'] == 'url':
+                continue
+            resource_type = {"pdf": "PDF", "folder": "Folder", "url": "URL", "quiz": "Quiz"}[resource['type']]
+            progress.update(task, description=f"{i}/{len(resources)} ({resource_type}) {resource['display_name'][:30]}...")
+            
+            success = False
+            if resource['type'] == 'pdf':
+                success = download_pdf_resource(page, resource, output, course_folder, task, progress)
+            elif resource['type'] == 'folder':
+                success = download_folder_resource(page, resource, output, course_folder, task, progress)
+            elif resource['type'] == 'quiz':
+                if process_quiz(page, resource):
+                    # For quizzes, create sub-progress for questions
+                    question_buttons = page.query_selector_all("a.qnbutton")
+                    question_count = len(question_buttons) if question_buttons else 0
+                    
+                    quiz_task = progress.add_task(f"Quiz questions...", total=question_count)
+                    success = process_quiz_questions(page, resource, course_name, output, quiz_task, progress)
+                    progress.remove_task(quiz_task)
+            
+            if success:
+                processed.append(resource)
+            else:
+                metrics.inc("scraper_failures_total", kind=resource['type'])
+            metrics.inc("scraper_resources_processed_total", type=resource['type'], status="ok" if success else "failed")
+            metrics.set("scraper_queue_depth", len(resources) - i, queue="resources")
+            progress.advance(task, 1)
+
+    output.flush()
+    return processed
+
+def process_course(page, course_name, course_url, output, select_all=False, bulk_links=True):
+    """Process a single course.
+
+    With select_all the resource prompt is skipped and every resource is processed.
+    With bulk_links URL resources are resolved over plain HTTP instead of the browser.
+    """
     # Navigate directly to the course URL
-    page.goto(course_url)
+    navigate(page, course_url)
     sleep(1)
 
-    course_name_clean = clean_filename(course_name)
-    course_folder = f"output/{course_name_clean}"
-    os.makedirs(course_folder, exist_ok=True)
+    course_folder = clean_filename(course_name)
 
     # Capture course overview screenshot
-    capture_course_overview(page, course_folder)
+    capture_course_overview(page, output, course_folder)
 
     # Get all resources (PDFs, URLs, Quizzes) and let user select
     console.print(f"\n[bold blue]=== Processing {course_name} ===[/bold blue]")
     resource_groups = get_all_resources(page)
     
     if resource_groups:
-        selected_resources = select_all_resources(resource_groups)
+        if select_all:
+            selected_resources = [resource for resources in resource_groups.values() for resource in resources]
+        else:
+            selected_resources = select_all_resources(resource_groups)
         
         if selected_resources:
-            # Process resources with progress bar
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                BarColumn(),
-                TaskProgressColumn(),
-                console=console
-            ) as progress:
-                
-                task = progress.add_task("Processing resources...", total=len(selected_resources))
-                
-                # Process each selected resource by type
-                for i, resource in enumerate(selected_resources, 1):
-                    resource_type = {"pdf": "PDF", "folder": "Folder", "url": "URL", "quiz": "Quiz"}[resource['type']]
-                    progress.update(task, description=f"{i}/{len(selected_resources)} ({resource_type}) {resource['display_name'][:30]}...")
-                    
-                    if resource['type'] == 'pdf':
-                        download_pdf_resource(page, resource, course_folder, task, progress)
-                    elif resource['type'] == 'folder':
-                        download_folder_resource(page, resource, course_folder, task, progress)
-                    elif resource['type'] == 'url':
-                        open_url_resource(page, resource, course_folder, task, progress)
-                    elif resource['type'] == 'quiz':
-                        if process_quiz(page, resource):
-                            # For quizzes, create sub-progress for questions
-                            question_buttons = page.query_selector_all("a.qnbutton")
-                            question_count = len(question_buttons) if question_buttons else 0
-                            
-                            quiz_task = progress.add_task(f"Quiz questions...", total=question_count)
-                            process_quiz_questions(page, resource, course_name, quiz_task, progress)
-                            progress.remove_task(quiz_task)
-                    
-                    progress.advance(task, 1)
-                    
+            process_resources(page, course_name, selected_resources, output, bulk_links)
             console.print(f"[green]✓ Completed processing {course_name}[/green]")
     else:
         console.print("[yellow]No resources found[/yellow]")
 
     return True
 
-def capture_course_overview(page, course_folder):
+def capture_course_overview(page, output, course_folder):
     """Capture a screenshot of the main course page."""
     try:
         # Remove header/footer for privacy using existing function
@@ -640,12 +734,10 @@ def capture_course_overview(page, course_folder):
         main_region = page.query_selector("#region-main")
         if main_region:
             # Take screenshot of the main region
-            screenshot_path = os.path.join(course_folder, "course.png")
-            main_region.screenshot(path=screenshot_path)
+            output.write_bytes(f"{course_folder}/course.png", main_region.screenshot())
             return True
         else:
-            screenshot_path = os.path.join(course_folder, "course.png")
-            page.screenshot(path=screenshot_path, full_page=True)
+            output.write_bytes(f"{course_folder}/course.png", page.screenshot(full_page=True))
             return True
             
     except Exception as e:
@@ -656,7 +748,7 @@ def get_available_courses(page):
     """Get all available courses from the user's dashboard."""
     try:
         # Navigate to dashboard
-        page.goto(DASHBOARD_URL)
+        navigate(page, DASHBOARD_URL)
         sleep(2)
         
         # Ensure "All (except removed from view)" is selected in grouping dropdown
@@ -723,6 +815,9 @@ def get_available_courses(page):
 
 def select_courses(available_courses):
     """Prompt user to select courses to process."""
+    import asyncio
+    import questionary
+
     if not available_courses:
         console.print("[yellow]No courses found[/yellow]")
         return []
@@ -771,49 +866,512 @@ def select_courses(available_courses):
     else:
         return []
 
-def main():
-    """Main function to run the scraper."""
+def open_session(p, headless=False, cache=None):
+    """Launch the browser, restore cookies and make sure we are logged in."""
+    browser = p.firefox.launch(headless=headless)
+    page = browser.new_page()
+    if cache:
+        cache.attach(page.context)
+
+    # Load cookies and navigate to the site
+    load_cookies(page)
+    navigate(page, BASE_URL)
+    sleep(1)  # Wait for page to load
+
+    # Handle login if needed
+    if not login(page):
+        console.print("[red]Login failed[/red]")
+        metrics.inc("scraper_failures_total", kind="login")
+        browser.close()
+        return None, None
+
+    console.print()
+    return browser, page
+
+def fetch_and_select_courses(page):
+    """Fetch the courses from the dashboard and let the user pick some."""
+    with console.status("[bold green]Fetching available courses..."):
+        available_courses = get_available_courses(page)
+
+    if not available_courses:
+        console.print("[red]No available courses found[/red]")
+        return []
+
+    # Let user select courses to process
+    selected_courses = select_courses(available_courses)
+    if not selected_courses:
+        console.print("[yellow]No courses selected[/yellow]")
+    return selected_courses
+
+def open_cache(args):
+    """Create the response cache requested on the command line, if any."""
+    if not (args.cache or args.cache_pages or args.replay):
+        return None
+    return ResponseCache(
+        args.cache_file,
+        ttl=args.cache_ttl,
+        max_bytes=args.cache_size * 1024 * 1024,
+        cache_pages=args.cache_pages,
+        replay=args.replay
+    )
+
+def cache_arguments(args):
+    """Command line arguments that pass the cache settings on to a worker process."""
+    arguments = ["--cache-file", args.cache_file, "--cache-ttl", str(args.cache_ttl),
+                 "--cache-size", str(args.cache_size)]
+    for flag in ("cache", "cache_pages", "replay"):
+        if getattr(args, flag):
+            arguments.append("--" + flag.replace("_", "-"))
+    return arguments
+
+def run_sharded(args):
+    """Select courses once, then scrape them with several worker processes and merge the results."""
+    from playwright.sync_api import sync_playwright
+
     with sync_playwright() as p:
-        browser = p.firefox.launch(headless=False)
-        page = browser.new_page()
+        cache = open_cache(args)
+        browser, page = open_session(p, args.headless, cache)
+        if not page:
+            return
 
-        # Load cookies and navigate to the site
-        load_cookies(page)
-        page.goto(BASE_URL)
-        sleep(1)  # Wait for page to load
+        selected_courses = fetch_and_select_courses(page)
+        save_cookies(page)  # Workers reuse this session instead of logging in again
+        browser.close()
+        if cache:
+            cache.close()
 
-        # Handle login if needed
-        if not login(page):
-            console.print("[red]Login failed[/red]")
-            browser.close()
+    if not selected_courses:
+        return
+
+    clear_staging(args.staging_dir)
+    courses_file = os.path.join(args.staging_dir, "courses.json")
+    with open(courses_file, 'w', encoding='utf-8') as f:
+        json.dump(selected_courses, f, indent=2, ensure_ascii=False)
+
+    console.print(f"[bold blue]Starting {args.shards} workers for {len(selected_courses)} courses, "
+                  f"logs in {args.staging_dir}/shard-<n>.log...[/bold blue]")
+    workers = []
+    logs = []
+    for index in range(args.shards):
+        # Workers share no terminal: progress bars and prompts of K processes would garble it
+        command = [
+            sys.executable, os.path.abspath(__file__), "scrape",
+            "--shard", f"{index}/{args.shards}",
+            "--courses-file", courses_file,
+            "--staging-dir", args.staging_dir,
+            "--no-progress"
+        ]
+        if args.headless:
+            command.append("--headless")
+        if args.metrics_port:
+            # Every worker gets its own endpoint right after the coordinator's
+            command.extend(["--metrics-port", str(args.metrics_port + 1 + index),
+                            "--metrics-host", args.metrics_host])
+        command.extend(cache_arguments(args))
+
+        # Kept next to, not inside, the shard folder, which the worker empties when it starts
+        log = open(os.path.join(args.staging_dir, f"shard-{index}.log"), 'w', encoding='utf-8')
+        logs.append(log)
+        workers.append(subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT))
+
+    failed = [index for index, worker in enumerate(workers) if worker.wait() != 0]
+    for log in logs:
+        log.close()
+    for index in failed:
+        console.print(f"[red]Worker {index} failed, its courses will be missing. "
+                      f"See {os.path.join(args.staging_dir, f'shard-{index}.log')}[/red]")
+
+    # Merge whatever finished, but still report crashed workers and conflicts
+    if not run_merge(args.staging_dir, args.output_dir) or failed:
+        sys.exit(1)
+
+def run_shard_worker(args):
+    """Scrape the courses of a single shard into its own staging folder."""
+    index, count = args.shard
+    shard_root = clear_shard(args.staging_dir, index)
+
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        cache = open_cache(args)
+        browser, page = open_session(p, args.headless, cache)
+        if not page:
+            sys.exit(1)
+
+        if args.courses_file:
+            courses = load_courses_file(args.courses_file)
+        else:
+            courses = get_available_courses(page)
+
+        shard_courses = select_shard(courses, index, count)
+        console.print(f"[bold blue]Shard {index}/{count}: {len(shard_courses)} of {len(courses)} courses[/bold blue]")
+
+        with DirectoryBackend(shard_root) as output:
+            for i, course in enumerate(shard_courses):
+                metrics.set("scraper_queue_depth", len(shard_courses) - i, queue="courses")
+                process_course(page, course['name'], course['url'], output, select_all=True,
+                               bulk_links=not args.replay)
+
+        page.goto("about:blank") # Free up any still open resources
+        browser.close()
+        if cache:
+            cache.close()
+
+    manifest = write_manifest(shard_root, index, count, shard_courses)
+    console.print(f"[bold green]✓ Shard {index}/{count} completed ({len(manifest['files'])} files).[/bold green]")
+
+def run_merge(staging_dir, output_dir):
+    """Merge the staging folders of all shards into the output folder."""
+    result = merge_shards(staging_dir, output_dir)
+
+    # Plain output, the merge command is offline and does not load rich
+    for root in result['missing']:
+        print(f"Skipping unfinished shard without manifest: {root}")
+    for root in result['stale']:
+        print(f"Skipping shard left over from a run with a different shard count: {root}")
+    for rel_path, roots in sorted(result['conflicts'].items()):
+        print(f"Conflict for {rel_path}: {', '.join(roots)}", file=sys.stderr)
+
+    print(f"Merged {len(result['merged'])} files "
+          f"({len(result['unchanged'])} unchanged, {len(result['conflicts'])} conflicts)")
+    return not result['conflicts']
+
+def load_courses_file(path):
+    """Load a JSON list of courses as written by a sharded run."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def check_course(page, course, output, state, bulk_links=True):
+    """Fingerprint a course and download only the resources that changed since the last check."""
+    navigate(page, course['url'])
+    sleep(1)
+
+    resource_groups = get_all_resources(page)
+    fingerprint = course_fingerprint(resource_groups)
+    course_state = state.get(course['url'])
+    if course_state and course_state['fingerprint'] == fingerprint:
+        console.print(f"[dim]{course['name']}: no changes[/dim]")
+        return []
+
+    resources = changed_resources(resource_groups, course_state)
+    processed = []
+    if resources:
+        console.print(f"\n[bold blue]=== {course['name']}: {len(resources)} new or changed resources ===[/bold blue]")
+        capture_course_overview(page, output, clean_filename(course['name']))
+        processed = process_resources(page, course['name'], resources, output, bulk_links)
+
+    # Forget resources that are gone from the page, remember the ones downloaded now
+    current = {resource_fingerprint(resource) for group in resource_groups.values() for resource in group}
+    known = set(course_state.get('resources', [])) if course_state else set()
+    done = (known & current) | {resource_fingerprint(resource) for resource in processed}
+
+    state[course['url']] = {
+        'name': course['name'],
+        # Failed resources leave the course fingerprint unset so they are retried on the next check
+        'fingerprint': fingerprint if len(processed) == len(resources) else None,
+        'resources': sorted(done)
+    }
+    return processed
+
+def run_watch(args):
+    """Keep one browser session open and poll the selected courses for new material."""
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        cache = open_cache(args)
+        browser, page = open_session(p, args.headless, cache)
+        if not page:
             return
-        
-        console.print()
 
-        # Get available courses from dashboard
-        with console.status("[bold green]Fetching available courses..."):
-            available_courses = get_available_courses(page)
-        
-        if not available_courses:
-            console.print("[red]No available courses found[/red]")
+        if args.courses_file:
+            courses = load_courses_file(args.courses_file)
+        else:
+            courses = fetch_and_select_courses(page)
+        if not courses:
             browser.close()
             return
 
-        # Let user select courses to process
-        selected_courses = select_courses(available_courses)
+        try:
+            with open_backend(args.bundle or args.output_dir) as output:
+                # Kept in the output, so a new or deleted output starts from scratch
+                state = load_watch_state(output)
+                while True:
+                    for i, course in enumerate(courses):
+                        metrics.set("scraper_queue_depth", len(courses) - i, queue="courses")
+                        try:
+                            check_course(page, course, output, state, not args.replay)
+                        except Exception as e:
+                            console.print(f"[red]Error checking {course['name']}: {e}[/red]")
+                            metrics.inc("scraper_failures_total", kind="course")
+                        save_watch_state(state, output)
+                    metrics.set("scraper_queue_depth", 0, queue="courses")
+                    save_cookies(page)
+
+                    page.goto("about:blank") # Free up any still open resources
+                    delay = next_delay(args.interval, args.jitter)
+                    console.print(f"[dim]Next check in {delay / 60:.1f} minutes[/dim]")
+                    sleep(delay)
+
+                    # The session may have expired while idle
+                    navigate(page, BASE_URL)
+                    sleep(1)
+                    if not login(page):
+                        console.print("[red]Login failed, stopping watch[/red]")
+                        break
+        except KeyboardInterrupt:
+            console.print("[yellow]Watch stopped[/yellow]")
+
+        browser.close()
+        if cache:
+            cache.close()
+
+def add_scrape_arguments(parser):
+    """Add the arguments of the scrape command."""
+    def shard_spec(value):
+        try:
+            return parse_shard(value)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+    parser.add_argument("--headless", action="store_true", help="run the browser without a window")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="folder for the scraped courses")
+    parser.add_argument("--bundle", metavar="FILE.sqlite",
+                        help="write everything into a single SQLite bundle instead of the output folder")
+    parser.add_argument("--no-progress", action="store_true",
+                        help="don't draw progress bars (implied when not running in a terminal)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve live Prometheus metrics on http://HOST:PORT/metrics")
+    parser.add_argument("--metrics-host", default="127.0.0.1", metavar="HOST",
+                        help="interface for the metrics endpoint")
+
+    watching = parser.add_argument_group("watch mode")
+    watching.add_argument("--watch", action="store_true",
+                          help="keep running and download only resources that changed since the last check")
+    watching.add_argument("--interval", type=float, default=3600, metavar="SECONDS",
+                          help=f"time between checks (at least {MIN_INTERVAL})")
+    watching.add_argument("--jitter", type=float, default=0.1, metavar="FRACTION",
+                          help="randomize the interval by up to this fraction")
+
+    caching = parser.add_argument_group("response cache")
+    caching.add_argument("--cache", action="store_true", help="serve static assets from a disk cache")
+    caching.add_argument("--cache-pages", action="store_true",
+                         help="also record pages and serve them from the cache while fresh")
+    caching.add_argument("--replay", action="store_true",
+                         help="run offline from recorded traffic only (record it with --cache-pages first)")
+    caching.add_argument("--cache-file", default=CACHE_FILE, help="SQLite file holding the cached responses")
+    caching.add_argument("--cache-ttl", type=int, default=DEFAULT_TTL, metavar="SECONDS",
+                         help="how long cached pages stay fresh")
+    caching.add_argument("--cache-size", type=int, default=1024, metavar="MB",
+                         help="evict least recently used responses above this size")
+
+    sharding = parser.add_argument_group("sharding")
+    mode = sharding.add_mutually_exclusive_group()
+    mode.add_argument("--shards", type=int, metavar="K",
+                      help="split the selected courses across K worker processes and merge the results")
+    mode.add_argument("--shard", type=shard_spec, metavar="INDEX/COUNT",
+                      help="run a single worker, e.g. on another machine sharing the filesystem")
+    sharding.add_argument("--courses-file",
+                          help="JSON list of courses for --shard (defaults to all courses) or --watch")
+    sharding.add_argument("--staging-dir", default=STAGING_DIR, help="folder for the per-shard output")
+
+
+def check_scrape_arguments(parser, args):
+    """Reject combinations of scrape arguments that don't make sense."""
+    if args.shards is not None and args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.watch and (args.shards or args.shard):
+        parser.error("--watch cannot be combined with sharding")
+    if not 0 <= args.jitter < 1:
+        parser.error("--jitter must be between 0 and 1")
+    if args.interval < MIN_INTERVAL:
+        parser.error(f"--interval must be at least {MIN_INTERVAL} seconds")
+    if args.bundle and not is_bundle_path(args.bundle):
+        parser.error("--bundle must end with .sqlite, .sqlite3 or .db")
+    if args.bundle and (args.shards or args.shard):
+        parser.error("sharded runs write to folders, use a single process for bundles")
+
+COMMANDS = ("scrape", "list-courses", "rebuild-markdown", "verify-output", "stats", "merge", "export-bundle")
+
+def parse_args(argv=None):
+    """Parse the command line arguments."""
+    if argv is None:
+        argv = sys.argv[1:]
+    # A plain `python scraper.py [options]` keeps working as the scrape command
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["scrape"] + list(argv)
+
+    parser = argparse.ArgumentParser(description="Scrape courses from " + BASE_URL)
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    scrape = subparsers.add_parser("scrape", help="download course material (default)")
+    add_scrape_arguments(scrape)
+
+    list_courses = subparsers.add_parser("list-courses", help="print the courses on your dashboard")
+    list_courses.add_argument("--headless", action="store_true", help="run the browser without a window")
+    list_courses.add_argument("--json", action="store_true", help="print the courses as JSON")
+
+    offline_commands = {
+        "rebuild-markdown": "regenerate question markdown from the saved sources, without a browser",
+        "verify-output": "check the output for damaged or incomplete files, without a browser",
+        "stats": "summarize the output per course, without a browser",
+    }
+    for name, help_text in offline_commands.items():
+        command = subparsers.add_parser(name, help=help_text)
+        command.add_argument("--output", default=OUTPUT_DIR, help="output folder or SQLite bundle")
+        if name == "stats":
+            command.add_argument("--json", action="store_true", help="print the stats as JSON")
+
+    merge = subparsers.add_parser("merge", help="merge finished shards into the output folder, without a browser")
+    merge.add_argument("--output", default=OUTPUT_DIR, help="output folder")
+    merge.add_argument("--staging-dir", default=STAGING_DIR, help="folder with the per-shard output")
+
+    export = subparsers.add_parser("export-bundle",
+                                   help="restore the folder layout of a SQLite bundle, without a browser")
+    export.add_argument("bundle", metavar="FILE.sqlite", help="bundle to export")
+    export.add_argument("--output", default=OUTPUT_DIR, help="output folder to restore into")
+
+    args = parser.parse_args(argv)
+    if args.command == "scrape":
+        check_scrape_arguments(scrape, args)
+    elif args.command == "export-bundle" and not is_bundle_path(args.bundle):
+        export.error("the bundle must end with .sqlite, .sqlite3 or .db")
+    if args.command in ("merge", "export-bundle") and is_bundle_path(args.output):
+        parser.error(f"{args.command} writes to an output folder, not a bundle")
+    return args
+
+def run_list_courses(args):
+    """Print the courses available on the dashboard."""
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        browser, page = open_session(p, args.headless)
+        if not page:
+            sys.exit(1)
+        courses = get_available_courses(page)
+        browser.close()
+
+    if args.json:
+        print(json.dumps(courses, indent=2, ensure_ascii=False))
+    else:
+        for course in courses:
+            print(f"{course['name']}\t{course['url']}")
+
+def open_existing_output(path, read_only=True):
+    """Open the output for an offline command, without creating it if it is missing."""
+    if not os.path.exists(path):
+        print(f"Output not found: {path}", file=sys.stderr)
+        sys.exit(1)
+    return open_backend(path, read_only=read_only)
+
+def run_rebuild_markdown(args):
+    """Regenerate the markdown of every saved question."""
+    with open_existing_output(args.output, read_only=False) as output:
+        count = rebuild_markdown(output)
+    print(f"Rebuilt {count} question files in {args.output}")
+
+def run_verify_output(args):
+    """Report damaged or incomplete files and exit with an error if there are any."""
+    with open_existing_output(args.output) as output:
+        problems = verify_output(output)
+    for problem in problems:
+        print(problem)
+    if problems:
+        print(f"{len(problems)} problems found in {args.output}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{args.output} is OK")
+
+def run_stats(args):
+    """Print files, questions and sizes per course."""
+    with open_existing_output(args.output) as output:
+        stats = output_stats(output)
+
+    if args.json:
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+        return
+
+    def count(course_stats, kind):
+        return course_stats['kinds'].get(kind, {}).get('files', 0)
+
+    print(f"{'Course':<40} {'Quizzes':>7} {'Questions':>9} {'Documents':>9} {'Links':>5} {'Size':>10}")
+    for name, course_stats in sorted(stats.items()):
+        print(f"{name[:40]:<40} {course_stats['quizzes']:>7} {count(course_stats, 'question'):>9} "
+              f"{count(course_stats, 'document'):>9} {course_stats['links']:>5} {format_size(course_stats['bytes']):>10}")
+    total_bytes = sum(course_stats['bytes'] for course_stats in stats.values())
+    print(f"{len(stats)} courses, {sum(c['files'] for c in stats.values())} files, {format_size(total_bytes)}")
+
+def run_merge_shards(args):
+    """Merge the shards of a sharded run and exit with an error on conflicts."""
+    if not run_merge(args.staging_dir, args.output):
+        sys.exit(1)
+
+def run_export_bundle(args):
+    """Restore the folder layout of a bundle."""
+    try:
+        count = export_bundle(args.bundle, args.output)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f"Exported {count} files to {args.output}")
+
+def run_scrape(args):
+    """Download course material, in one of the scrape modes."""
+    global show_progress
+    show_progress = not args.no_progress and console.is_terminal
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port, args.metrics_host)
+        console.print(f"[dim]Serving metrics on http://{args.metrics_host}:{args.metrics_port}/metrics[/dim]")
+
+    if args.shard:
+        run_shard_worker(args)
+        return
+    if args.shards:
+        run_sharded(args)
+        return
+    if args.watch:
+        run_watch(args)
+        return
+
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        cache = open_cache(args)
+        browser, page = open_session(p, args.headless, cache)
+        if not page:
+            return
+
+        selected_courses = fetch_and_select_courses(page)
         if not selected_courses:
-            console.print("[yellow]No courses selected[/yellow]")
             browser.close()
             return
 
         # Process each selected course
-        for course in selected_courses:
-            process_course(page, course['name'], course['url'])
+        with open_backend(args.bundle or args.output_dir) as output:
+            for i, course in enumerate(selected_courses):
+                metrics.set("scraper_queue_depth", len(selected_courses) - i, queue="courses")
+                process_course(page, course['name'], course['url'], output, bulk_links=not args.replay)
+            metrics.set("scraper_queue_depth", 0, queue="courses")
 
         page.goto("about:blank") # Free up any still open resources
 
         browser.close()
+        if cache:
+            console.print(f"[dim]Response cache: {cache.hits} hits, {cache.misses} misses[/dim]")
+            cache.close()
         console.print("[bold green]✓ Scraping completed.[/bold green]")
 
+def main(argv=None):
+    """Main function to run the scraper."""
+    args = parse_args(argv)
+    commands = {
+        "scrape": run_scrape,
+        "list-courses": run_list_courses,
+        "rebuild-markdown": run_rebuild_markdown,
+        "verify-output": run_verify_output,
+        "stats": run_stats,
+        "merge": run_merge_shards,
+        "export-bundle": run_export_bundle,
+    }
+    commands[args.command](args)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
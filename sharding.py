@@ -0,0 +1,227 @@
+"""Helpers for splitting a scraping run across several worker processes.
+
+Every worker writes into its own staging folder and records what it produced
+in a manifest. Once all workers are done, ``merge_shards`` combines the staging
+folders into the usual ``output/<course>`` layout.
+"""
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import time
+
+from output_tools import LINKS_INDEX
+
+STAGING_DIR = ".shards"
+MANIFEST_FILE = "manifest.json"
+
+
+def parse_shard(value):
+    """Parse a shard spec like ``2/4`` into ``(index, count)``."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected INDEX/COUNT (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{value}', index must be between 0 and {count - 1}")
+    return index, count
+
+
+def shard_index(key, shard_count):
+    """Map a key to a shard. Stable across processes, runs and machines."""
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return int(digest, 16) % shard_count
+
+
+def select_shard(courses, index, count):
+    """Return the courses assigned to the given shard, keyed by course URL."""
+    return [course for course in courses if shard_index(course['url'], count) == index]
+
+
+def shard_dir(staging_dir, index):
+    """Return the staging folder of a single shard."""
+    return os.path.join(staging_dir, f"shard-{index}")
+
+
+def clear_staging(staging_dir):
+    """Remove everything left in the staging folder by previous runs."""
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir, exist_ok=True)
+
+
+def clear_shard(staging_dir, index):
+    """Start a shard from an empty folder.
+
+    Leftovers of a previous run would otherwise be merged again, and an old
+    manifest would make a crashed worker look finished.
+    """
+    root = shard_dir(staging_dir, index)
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def write_manifest(root, index, count, courses):
+    """Record every file below ``root`` together with its size and digest."""
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+            if rel_path == MANIFEST_FILE:
+                continue
+            files[rel_path] = {
+                'sha256': file_digest(path),
+                'size': os.path.getsize(path)
+            }
+
+    manifest = {
+        'shard': index,
+        'shard_count': count,
+        'courses': [course['name'] for course in courses],
+        'finished': time.time(),
+        'files': files
+    }
+    with open(os.path.join(root, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+def load_manifests(staging_dir):
+    """Load the manifests of all shards found in the staging folder.
+
+    Returns ``(manifests, missing, stale)`` where ``missing`` lists shard
+    folders without a manifest, i.e. workers that did not finish, and
+    ``stale`` lists shards left over from a run with a different shard count.
+    """
+    manifests = []
+    missing = []
+    stale = []
+    if not os.path.isdir(staging_dir):
+        return manifests, missing, stale
+
+    for name in sorted(os.listdir(staging_dir)):
+        root = os.path.join(staging_dir, name)
+        if not os.path.isdir(root) or not name.startswith("shard-"):
+            continue
+        manifest_path = os.path.join(root, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            missing.append(root)
+            continue
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['root'] = root
+        manifests.append(manifest)
+
+    # The most recently finished shard tells how many shards the current run has
+    if manifests:
+        count = max(manifests, key=lambda manifest: manifest.get('finished', 0))['shard_count']
+        stale = [manifest['root'] for manifest in manifests
+                 if manifest['shard_count'] != count or manifest['shard'] >= count]
+        manifests = [manifest for manifest in manifests if manifest['root'] not in stale]
+
+    return manifests, missing, stale
+
+
+def load_links_index(path):
+    """Load a links index, or None if it is missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if isinstance(index, dict) else None
+
+
+def merge_shards(staging_dir, output_dir):
+    """Merge all finished shards into ``output_dir``.
+
+    A file is only copied when no other shard produced a different version of
+    it. Conflicting files are left in the staging folder and reported. Like a
+    single-process run, shard output replaces what an earlier run left in
+    ``output_dir``, except for the links indexes, whose entries are combined.
+
+    Returns a dict with the ``merged``, ``unchanged`` and ``conflicts`` paths,
+    the shard folders that were ``missing`` a manifest and the ``stale`` ones
+    from a run with a different shard count.
+    """
+    manifests, missing, stale = load_manifests(staging_dir)
+
+    # Decide on a single source for every relative path first, so that
+    # conflicts between shards are detected before anything gets copied
+    sources = {}
+    conflicts = {}
+    indexes = {}
+    for manifest in manifests:
+        for rel_path, info in manifest['files'].items():
+            if posixpath.basename(rel_path) == LINKS_INDEX:
+                indexes.setdefault(rel_path, []).append((manifest['root'], info['sha256']))
+                continue
+            if rel_path in conflicts:
+                conflicts[rel_path].append(manifest['root'])
+                continue
+            existing = sources.get(rel_path)
+            if existing is None:
+                sources[rel_path] = (manifest['root'], info['sha256'])
+            elif existing[1] != info['sha256']:
+                conflicts[rel_path] = [existing[0], manifest['root']]
+                del sources[rel_path]
+
+    merged = []
+    unchanged = []
+    for rel_path, (root, digest) in sorted(sources.items()):
+        source_path = os.path.join(root, rel_path)
+        target_path = os.path.join(output_dir, rel_path)
+
+        if not os.path.exists(source_path) or file_digest(source_path) != digest:
+            conflicts[rel_path] = [root]
+            continue
+
+        if os.path.exists(target_path) and file_digest(target_path) == digest:
+            unchanged.append(rel_path)
+            continue
+
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        shutil.copy2(source_path, target_path)
+        merged.append(rel_path)
+
+    for rel_path, shard_sources in sorted(indexes.items()):
+        target_path = os.path.join(output_dir, rel_path)
+        index = load_links_index(target_path) or {}
+        previous = dict(index)
+        for root, digest in shard_sources:
+            source_path = os.path.join(root, rel_path)
+            links = None
+            if os.path.exists(source_path) and file_digest(source_path) == digest:
+                links = load_links_index(source_path)
+            if links is None:
+                conflicts.setdefault(rel_path, []).append(root)
+                continue
+            index.update(links)
+
+        if index == previous:
+            if os.path.exists(target_path):
+                unchanged.append(rel_path)
+            continue
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(target_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False, sort_keys=True)
+        merged.append(rel_path)
+
+    return {
+        'merged': merged,
+        'unchanged': unchanged,
+        'conflicts': conflicts,
+        'missing': missing,
+        'stale': stale
+    }
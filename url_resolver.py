@@ -0,0 +1,126 @@
+"""Resolve Moodle URL resources over plain HTTP, without rendering them.
+
+A ``mod/url`` page either redirects straight to its target or shows the
+target inside a ``.urlworkaround`` box. Both can be read from a single HTTP
+response, so many resources can be resolved concurrently over a small pool
+of keep-alive connections that share the browser's session cookies.
+"""
+import html
+import http.client
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_WORKERS = 8
+TIMEOUT = 15
+
+URLWORKAROUND_RE = re.compile(
+    r'<div[^>]*class="[^"]*\burlworkaround\b[^"]*"[^>]*>.*?<a[^>]*href="([^"]+)"',
+    re.DOTALL | re.IGNORECASE
+)
+
+
+def cookie_header(cookies, host):
+    """Build a Cookie header from Playwright cookies that apply to ``host``."""
+    pairs = []
+    for cookie in cookies:
+        domain = cookie.get('domain', '').lstrip('.')
+        if host == domain or host.endswith('.' + domain):
+            pairs.append(f"{cookie['name']}={cookie['value']}")
+    return "; ".join(pairs)
+
+
+class ConnectionPool:
+    """Keep one keep-alive connection per host. Not thread-safe, use one pool per thread."""
+
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+        self.connections = {}
+
+    def _connection(self, scheme, host, fresh=False):
+        key = (scheme, host)
+        if fresh or key not in self.connections:
+            if key in self.connections:
+                self.connections[key].close()
+            connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            self.connections[key] = connection_class(host, timeout=TIMEOUT)
+        return self.connections[key]
+
+    def get(self, url):
+        """GET a URL without following redirects. Returns ``(status, headers, body)``."""
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        # A kept-alive connection may have been closed by the server, retry once on a fresh one
+        for attempt in range(2):
+            connection = self._connection(parts.scheme, parts.netloc, fresh=attempt > 0)
+            try:
+                connection.request("GET", path, headers=self.headers)
+                response = connection.getresponse()
+                body = response.read()
+                return response.status, dict(response.getheaders()), body
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if attempt:
+                    raise
+
+    def close(self):
+        for connection in self.connections.values():
+            connection.close()
+        self.connections.clear()
+
+
+def extract_target(url, status, headers, body, base_url):
+    """Work out the target of a URL resource from its HTTP response, or None."""
+    if 300 <= status < 400:
+        location = next((value for name, value in headers.items() if name.lower() == "location"), None)
+        if not location:
+            return None
+        target = urljoin(url, location)
+        # Only a redirect out of Moodle is the link itself. Inside Moodle it is the login
+        # page, an enrolment page or similar, which the browser fallback has to look at.
+        if target.startswith(base_url):
+            return None
+        return target
+
+    if status == 200:
+        match = URLWORKAROUND_RE.search(body.decode("utf-8", "replace"))
+        if match:
+            return html.unescape(match.group(1))
+
+    return None
+
+
+def resolve_urls(urls, cookies, base_url, user_agent=None, workers=DEFAULT_WORKERS):
+    """Resolve URL resources concurrently.
+
+    Returns a dict mapping every URL to its target, or to None when it could
+    not be resolved without a browser.
+    """
+    headers = {"Cookie": cookie_header(cookies, urlsplit(base_url).hostname or "")}
+    if user_agent:
+        headers["User-Agent"] = user_agent
+    pools = []
+    pools_lock = threading.Lock()
+    local = threading.local()
+
+    def resolve(url):
+        if not hasattr(local, 'pool'):
+            local.pool = ConnectionPool(headers)
+            with pools_lock:
+                pools.append(local.pool)
+        try:
+            status, response_headers, body = local.pool.get(url)
+            return url, extract_target(url, status, response_headers, body, base_url)
+        except (OSError, http.client.HTTPException):
+            return url, None
+
+    unique_urls = list(dict.fromkeys(urls))
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(unique_urls)))) as executor:
+            return dict(executor.map(resolve, unique_urls))
+    finally:
+        for pool in pools:
+            pool.close()
@@ -0,0 +1,66 @@
+"""Cheap change fingerprints for watch mode.
+
+A course is fingerprinted by hashing the resource list shown on its page, so
+checking for new material costs a single page load. The fingerprints of the
+last successful downloads are kept in a small JSON file inside the output
+itself, so they always describe what that output actually contains.
+"""
+import hashlib
+import json
+import random
+
+# Relative to the output folder or bundle, hidden from the offline commands
+WATCH_STATE_FILE = ".watch_state.json"
+
+# Shortest allowed time between checks, so watch mode never hammers the server
+MIN_INTERVAL = 60
+
+
+def resource_fingerprint(resource):
+    """Fingerprint a single resource by its type, URL and name."""
+    key = json.dumps([resource['type'], resource['url'], resource['display_name']], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def course_fingerprint(resource_groups):
+    """Fingerprint the whole resource list of a course, including its sections."""
+    key = json.dumps(
+        [[section, [resource_fingerprint(resource) for resource in resources]]
+         for section, resources in resource_groups.items()],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def changed_resources(resource_groups, course_state):
+    """Return the resources that were not downloaded successfully before."""
+    known = set(course_state.get('resources', [])) if course_state else set()
+    return [resource for resources in resource_groups.values() for resource in resources
+            if resource_fingerprint(resource) not in known]
+
+
+def load_watch_state(output):
+    """Load the watch state of an output, keyed by course URL.
+
+    A missing or unreadable state means nothing is known yet, so everything
+    gets downloaded again.
+    """
+    data = output.read_bytes(WATCH_STATE_FILE)
+    if not data:
+        return {}
+    try:
+        state = json.loads(data)
+    except ValueError:
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_watch_state(state, output):
+    """Write the watch state into the output."""
+    output.write_text(WATCH_STATE_FILE, json.dumps(state, indent=2, ensure_ascii=False))
+    output.flush()
+
+
+def next_delay(interval, jitter):
+    """Poll interval with random jitter, given as a fraction of the interval."""
+    return max(0.0, interval * (1 + random.uniform(-jitter, jitter)))